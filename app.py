@@ -33,6 +33,9 @@ from sqlalchemy import ForeignKey, exc
 from datetime import datetime
 from hashlib import md5
 
+# Import rate limiting module
+from ratelimit import RateLimiter
+
 
 # ========== Create application ========== #
 
@@ -41,6 +44,8 @@ app.config.from_pyfile('config.py')
 
 db = SQLAlchemy(app)
 
+limiter = RateLimiter(app)
+
 
 # When SQLAlchemy Integrity Error occurs
 class SQLAlchemyIntegrityError(HTTPException):
@@ -366,7 +371,12 @@ def view_admin():
 # Handle HTTP exceptions
 @app.errorhandler(HTTPException)
 def handle_exception(error):
-    return render_template('error.html', user=session, error=error), error.code
+    headers = {}
+    # Tell client when to retry if it sent too many requests
+    if getattr(error, 'retry_after', None):
+        headers['Retry-After'] = str(error.retry_after)
+
+    return render_template('error.html', user=session, error=error), error.code, headers
 
 
 # ========== Form definitions ========== #
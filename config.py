@@ -11,3 +11,24 @@ FLASK_DEBUG = 1
 SQLITE_DB = 'sqlite:///' + path.join(BASE_DIR, 'blog.sqlite') # Database filename
 SQLALCHEMY_DATABASE_URI = environ.get('DATABASE_URL') or SQLITE_DB
 SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+# Rate limiting configuration
+RATELIMIT_ENABLED = True
+# Limits of in-memory storage apply per worker process, so with
+# multiple workers use 'ratelimit:DatabaseStorage' instead
+RATELIMIT_STORAGE = 'ratelimit:MemoryStorage'
+RATELIMIT_STORAGE_URL = environ.get('RATELIMIT_STORAGE_URL') # Defaults to SQLALCHEMY_DATABASE_URI
+RATELIMIT_MAX_CLIENTS = 10000 # Per endpoint and bucket, new clients are rejected when full
+RATELIMIT_METHODS = ['POST'] # Only form submissions are rate limited
+RATELIMIT_RULES = {
+    # Endpoint    : {bucket: (requests, per seconds)}
+    # Buckets are kept per client IP address ('ip'), per username ('user')
+    # and per client IP address and username together ('ip_user').
+    # Limit per username must be higher than limit per client IP address,
+    # so a single client cannot lock out another user.
+    'user_login'  : {'ip': (20, 60), 'ip_user': (5, 60), 'user': (100, 60)},
+    'add_user'    : {'ip': (5, 300), 'user': (5, 300)},
+    'add_post'    : {'ip': (10, 60), 'user': (10, 60)},
+    'edit_post'   : {'ip': (20, 60), 'user': (20, 60)},
+    'delete_post' : {'ip': (20, 60), 'user': (20, 60)},
+}
@@ -0,0 +1,293 @@
+"""
+
+Simple rate limiting for the blog web application.
+
+Every rate limited route has token buckets for each client. Buckets
+can be kept per client IP address ('ip'), per username ('user') and
+per client IP address and username together ('ip_user'). A bucket
+holds up to 'limit' tokens and is refilled at 'limit' tokens per
+'period' seconds. Each request takes one token from each of its
+buckets, but only if all of them have one; otherwise the request is
+rejected with '429 Too Many Requests' and a 'Retry-After' header.
+
+Buckets are kept in a storage backend. By default this is an
+in-memory store, which is fast but is not shared between worker
+processes, so with N workers every limit is in effect N times higher.
+With multiple workers use the database storage, which is shared by
+all of them. Other backends can be added by extending Storage class.
+
+@author     Gregor Anželj <gregor.anzelj@gmail.com>
+@license    GNU GPL
+@copyright  (C) Gregor Anželj 2020
+
+"""
+
+# Import Flask modules
+from flask import request, session
+from werkzeug.exceptions import HTTPException
+from werkzeug.utils import import_string
+
+# Import SQLAlchemy modules
+from sqlalchemy import create_engine, event, and_, select
+from sqlalchemy import MetaData, Table, Column, String, Float
+from sqlalchemy.exc import IntegrityError
+
+# Import other modules
+from collections import OrderedDict
+from math import ceil
+from threading import Lock
+from time import monotonic, time
+
+
+# When client sends too many requests
+class RateLimitExceeded(HTTPException):
+    code = 429
+    name = 'Too Many Requests'
+    description = 'You have sent too many requests in a short time. Wait a moment and try again.'
+
+    def __init__(self, retry_after, description=None):
+        super().__init__(description)
+        self.retry_after = retry_after
+
+
+# ========== Storage backends ========== #
+
+# Base class for token bucket storage
+#
+# Each bucket is given as (scope, key, limit, period) tuple, where
+# scope is e.g. 'user_login:ip' and key is e.g. client IP address.
+# All buckets of a scope must use the same limit and period.
+class Storage:
+    def __init__(self, app=None):
+        self.clock = time
+
+    # Take one token from each of the given buckets
+    # This must be atomic: tokens are taken only if every bucket has one,
+    # otherwise no bucket is changed, also not by concurrent requests
+    # Returns 0 if tokens were taken or number of seconds to wait otherwise
+    def consume(self, buckets, now=None):
+        raise NotImplementedError
+
+    # Remove all buckets
+    def clear(self):
+        raise NotImplementedError
+
+
+# In-memory storage for token buckets (per process)
+#
+# Buckets of each scope are kept in their own ordered dict, least
+# recently used first, so lookups, updates and eviction are all O(1).
+# A bucket refills completely within one period after it was last
+# used, and is then the same as a new (full) one, so it can be evicted
+# without losing anything. Each scope keeps buckets for at most
+# RATELIMIT_MAX_CLIENTS clients. When a scope is full, requests from
+# new clients are rejected until the least recently used bucket expires,
+# as evicting a bucket that is not full would give away free tokens.
+class MemoryStorage(Storage):
+    def __init__(self, app=None):
+        self.scopes = {}
+        self.lock = Lock()
+        self.clock = monotonic
+        self.max_clients = app.config['RATELIMIT_MAX_CLIENTS'] if app else 10000
+
+    def consume(self, buckets, now=None):
+        if now is None:
+            now = self.clock()
+
+        with self.lock:
+            wait = 0
+            found = []
+            for scope, key, limit, period in buckets:
+                stored = self.scopes.get(scope)
+                if stored is None:
+                    stored = self.scopes[scope] = OrderedDict()
+
+                # Evict expired buckets from the least recently used end
+                while stored:
+                    oldest = next(iter(stored.values()))
+                    if oldest[1] + period > now:
+                        break
+                    stored.popitem(last=False)
+
+                # Count tokens in the bucket
+                bucket = stored.get(key)
+                if bucket is not None:
+                    tokens = min(limit, bucket[0] + (now - bucket[1]) * limit / period)
+                    if tokens < 1:
+                        wait = max(wait, (1 - tokens) * period / limit)
+                elif len(stored) < self.max_clients:
+                    tokens = limit
+                else:
+                    tokens = limit
+                    oldest = next(iter(stored.values()))
+                    wait = max(wait, oldest[1] + period - now)
+                found.append((stored, key, tokens))
+
+            if wait:
+                return wait
+
+            # Take a token from each bucket and mark it as the most recently used one
+            for stored, key, tokens in found:
+                stored.pop(key, None)
+                stored[key] = (tokens - 1, now)
+
+        return 0
+
+    def clear(self):
+        with self.lock:
+            self.scopes.clear()
+
+
+# Database storage for token buckets (shared by all workers)
+#
+# Buckets are kept in 'ratelimit' table of the database given by
+# RATELIMIT_STORAGE_URL or, if it is not set, SQLALCHEMY_DATABASE_URI.
+# Each request is handled in a single transaction, which locks the
+# rows of its buckets, so concurrent requests cannot overspend tokens.
+class DatabaseStorage(Storage):
+    def __init__(self, app=None):
+        url = app.config.get('RATELIMIT_STORAGE_URL') or app.config['SQLALCHEMY_DATABASE_URI']
+        self.engine = create_engine(url)
+        self.clock = time
+
+        # SQLite does not support row locks and Python's sqlite3 module
+        # starts transactions lazily, so lock the database at the start
+        if self.engine.dialect.name == 'sqlite':
+            @event.listens_for(self.engine, 'connect')
+            def do_connect(dbapi_connection, connection_record):
+                dbapi_connection.isolation_level = None
+
+            @event.listens_for(self.engine, 'begin')
+            def do_begin(connection):
+                connection.execute('BEGIN IMMEDIATE')
+
+        metadata = MetaData()
+        self.table = Table(
+            'ratelimit', metadata,
+            Column('scope', String, primary_key=True),
+            Column('key', String, primary_key=True),
+            Column('tokens', Float, nullable=False),
+            Column('stamp', Float, nullable=False),
+            Column('expires', Float, nullable=False, index=True)
+        )
+        metadata.create_all(self.engine)
+
+    def consume(self, buckets, now=None):
+        if now is None:
+            now = self.clock()
+        table = self.table
+
+        try:
+            with self.engine.begin() as connection:
+                # Evict expired buckets
+                connection.execute(table.delete().where(table.c.expires <= now))
+
+                # Count tokens in each bucket
+                wait = 0
+                found = []
+                for scope, key, limit, period in buckets:
+                    where = and_(table.c.scope == scope, table.c.key == key)
+                    bucket = connection.execute(
+                        select([table.c.tokens, table.c.stamp]).where(where).with_for_update()
+                    ).first()
+                    if bucket is None:
+                        tokens = limit
+                    else:
+                        tokens = min(limit, bucket.tokens + (now - bucket.stamp) * limit / period)
+                        if tokens < 1:
+                            wait = max(wait, (1 - tokens) * period / limit)
+                    found.append((scope, key, period, where, tokens, bucket is None))
+
+                if wait:
+                    return wait
+
+                # Take a token from each bucket
+                for scope, key, period, where, tokens, new in found:
+                    values = {'tokens': tokens - 1, 'stamp': now, 'expires': now + period}
+                    if new:
+                        connection.execute(table.insert().values(scope=scope, key=key, **values))
+                    else:
+                        connection.execute(table.update().where(where).values(**values))
+        except IntegrityError:
+            # Concurrent request has just created the same bucket, try again
+            return self.consume(buckets, now)
+
+        return 0
+
+    def clear(self):
+        with self.engine.begin() as connection:
+            connection.execute(self.table.delete())
+
+
+# ========== Rate limiter ========== #
+
+class RateLimiter:
+    KINDS = ('ip', 'user', 'ip_user')
+
+    def __init__(self, app=None):
+        self.rules = {}
+        self.storage = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('RATELIMIT_ENABLED', True)
+        app.config.setdefault('RATELIMIT_STORAGE', 'ratelimit:MemoryStorage')
+        app.config.setdefault('RATELIMIT_MAX_CLIENTS', 10000)
+        app.config.setdefault('RATELIMIT_METHODS', ['POST'])
+        app.config.setdefault('RATELIMIT_RULES', {})
+
+        # Storage can be given as 'module:Class' import string or as an object
+        storage = app.config['RATELIMIT_STORAGE']
+        if isinstance(storage, str):
+            storage = import_string(storage)(app)
+        self.storage = storage
+
+        self.enabled = app.config['RATELIMIT_ENABLED']
+        self.methods = frozenset(app.config['RATELIMIT_METHODS'])
+
+        # Prepare (scope, kind, limit, period) for each bucket of each endpoint
+        self.rules = {}
+        for endpoint, buckets in app.config['RATELIMIT_RULES'].items():
+            self.rules[endpoint] = []
+            for kind, (limit, period) in buckets.items():
+                if kind not in self.KINDS:
+                    raise ValueError('Unknown rate limit bucket %r for %r endpoint.' % (kind, endpoint))
+                self.rules[endpoint].append(('%s:%s' % (endpoint, kind), kind, limit, period))
+
+        app.before_request(self.check_request)
+
+    # Check current request against the rules for its endpoint
+    def check_request(self):
+        # Resolve request proxy only once, as every lookup is slow
+        current = request._get_current_object()
+        if not self.enabled or current.method not in self.methods:
+            return
+        rules = self.rules.get(current.endpoint)
+        if rules is None:
+            return
+
+        # Username of the user signing in, otherwise of the signed in user
+        if current.endpoint == 'user_login':
+            username = current.form.get('username')
+        else:
+            username = session.get('username')
+        if username:
+            username = username.lower()
+
+        address = current.remote_addr
+        buckets = []
+        for scope, kind, limit, period in rules:
+            if kind == 'ip':
+                key = address
+            elif not username:
+                continue
+            elif kind == 'user':
+                key = username
+            else:
+                key = '%s %s' % (address, username)
+            buckets.append((scope, key, limit, period))
+
+        wait = self.storage.consume(buckets)
+        if wait:
+            raise RateLimitExceeded(int(ceil(wait)))
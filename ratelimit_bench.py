@@ -0,0 +1,111 @@
+"""
+
+Benchmark for rate limiting of the blog web application.
+
+Measures the time of MemoryStorage.consume() for allowed and for
+rejected requests, and the time of a whole RateLimiter.check_request()
+call, which is the overhead rate limiting adds to each request.
+Tests are in 'test_ratelimit.py'.
+
+To run it use the following command:
+> python ratelimit_bench.py
+
+@author     Gregor Anželj <gregor.anzelj@gmail.com>
+@license    GNU GPL
+@copyright  (C) Gregor Anželj 2020
+
+"""
+
+# Use in-memory database, so benchmark doesn't change the blog database
+from os import environ
+environ['DATABASE_URL'] = 'sqlite://'
+
+# Import other modules
+from timeit import timeit
+
+# Import blog web application and rate limiting modules
+from app import app, limiter
+from ratelimit import MemoryStorage, RateLimitExceeded
+
+
+CLIENTS = 1000  # Well below RATELIMIT_MAX_CLIENTS, so no client is rejected because store is full
+CALLS = 200000
+
+
+def run(name, function, calls=CALLS):
+    seconds = timeit(function, number=calls)
+    print('%-48s %6.2f us per call' % (name, seconds / calls * 1e6))
+
+
+# ========== Storage ========== #
+
+# Requests of 1000 clients with IP address and username buckets
+buckets = [
+    [('bench:ip', '10.0.%d.%d' % (i // 256, i % 256), 5, 60), ('bench:user', 'user%d' % i, 5, 60)]
+    for i in range(CLIENTS)
+]
+
+# Each client sends a request every 12 seconds, which refills one token,
+# so every request is allowed
+storage = MemoryStorage()
+calls = [0, 0]
+def allowed():
+    n = calls[0]
+    calls[0] += 1
+    calls[1] += storage.consume(buckets[n % CLIENTS], now=n * 12 / CLIENTS) == 0
+run('MemoryStorage.consume(), allowed', allowed)
+print('%48s %6d of %d allowed' % ('', calls[1], calls[0]))
+
+# All clients have used up their tokens, so every request is rejected
+storage = MemoryStorage()
+for i in range(5):
+    for client in buckets:
+        storage.consume(client, now=0)
+calls = [0, 0]
+def rejected():
+    n = calls[0]
+    calls[0] += 1
+    calls[1] += storage.consume(buckets[n % CLIENTS], now=0) > 0
+run('MemoryStorage.consume(), rejected', rejected)
+print('%48s %6d of %d rejected' % ('', calls[1], calls[0]))
+
+
+# ========== Whole request check ========== #
+
+# Sign in request with client IP address, IP address and username,
+# and username buckets; clock moves 12 seconds per request, so every
+# request is allowed
+clock = [0]
+limiter.storage.clear()
+limiter.storage.clock = lambda: clock[0]
+calls = [0, 0]
+def check_allowed():
+    calls[0] += 1
+    clock[0] += 12
+    try:
+        limiter.check_request()
+        calls[1] += 1
+    except RateLimitExceeded:
+        pass
+
+def check_rejected():
+    calls[0] += 1
+    try:
+        limiter.check_request()
+    except RateLimitExceeded:
+        calls[1] += 1
+
+with app.test_request_context(
+    '/login', method='POST',
+    data={'username': 'admin', 'password': 'password'},
+    environ_base={'REMOTE_ADDR': '10.0.0.1'}
+):
+    run('RateLimiter.check_request(), allowed', check_allowed, CALLS // 4)
+    print('%48s %6d of %d allowed' % ('', calls[1], calls[0]))
+
+    # Clock stops, so the rest of tokens are used up and then every request is rejected
+    for i in range(5):
+        check_rejected()
+    calls = [0, 0]
+    run('RateLimiter.check_request(), rejected', check_rejected, CALLS // 4)
+    print('%48s %6d of %d rejected' % ('', calls[1], calls[0]))
@@ -0,0 +1,176 @@
+"""
+
+Tests for rate limiting of the blog web application.
+
+To run them use the following command:
+> python -m pytest test_ratelimit.py
+
+@author     Gregor Anželj <gregor.anzelj@gmail.com>
+@license    GNU GPL
+@copyright  (C) Gregor Anželj 2020
+
+"""
+
+# Use in-memory database, so tests don't change the blog database
+from os import environ
+environ['DATABASE_URL'] = 'sqlite://'
+
+# Import other modules
+import pytest
+
+# Import blog web application and rate limiting modules
+from app import app, limiter
+from ratelimit import MemoryStorage, DatabaseStorage
+
+
+# ========== Fixtures ========== #
+
+# Test client with empty rate limit storage and clock set to zero
+@pytest.fixture
+def client():
+    clock = [0]
+    limiter.storage.clear()
+    limiter.storage.clock = lambda: clock[0]
+    with app.test_client() as client:
+        client.clock = clock
+        yield client
+
+
+def login(client, username, address):
+    return client.post(
+        '/login',
+        data={'username': username, 'password': 'wrong password'},
+        environ_base={'REMOTE_ADDR': address}
+    )
+
+
+# ========== Storage tests ========== #
+
+@pytest.fixture(params=['memory', 'database'])
+def storage(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryStorage()
+    app.config['RATELIMIT_STORAGE_URL'] = 'sqlite:///' + str(tmp_path / 'ratelimit.sqlite')
+    try:
+        return DatabaseStorage(app)
+    finally:
+        app.config['RATELIMIT_STORAGE_URL'] = None
+
+
+def test_storage_rejects_with_wait_time(storage):
+    for i in range(5):
+        assert storage.consume([('test', 'ip', 5, 60)], now=0) == 0
+    assert storage.consume([('test', 'ip', 5, 60)], now=0) == 12
+
+
+def test_storage_refills(storage):
+    for i in range(5):
+        storage.consume([('test', 'ip', 5, 60)], now=0)
+    assert storage.consume([('test', 'ip', 5, 60)], now=12) == 0
+    assert storage.consume([('test', 'ip', 5, 60)], now=12) == 12
+    for i in range(5):
+        assert storage.consume([('test', 'ip', 5, 60)], now=100) == 0
+
+
+def test_storage_rejected_request_takes_no_tokens(storage):
+    for i in range(5):
+        storage.consume([('test:ip', 'ip', 5, 60)], now=0)
+    for i in range(10):
+        assert storage.consume([('test:ip', 'ip', 5, 60), ('test:user', 'admin', 5, 60)], now=0) == 12
+    for i in range(5):
+        assert storage.consume([('test:ip', 'other', 5, 60), ('test:user', 'admin', 5, 60)], now=0) == 0
+
+
+def test_database_storage_is_shared(tmp_path):
+    app.config['RATELIMIT_STORAGE_URL'] = 'sqlite:///' + str(tmp_path / 'ratelimit.sqlite')
+    try:
+        workers = [DatabaseStorage(app), DatabaseStorage(app)]
+    finally:
+        app.config['RATELIMIT_STORAGE_URL'] = None
+    for i in range(5):
+        assert workers[i % 2].consume([('test', 'ip', 5, 60)], now=0) == 0
+    assert workers[1].consume([('test', 'ip', 5, 60)], now=0) == 12
+
+
+def test_memory_storage_evicts_expired_buckets_per_scope():
+    storage = MemoryStorage()
+    for i in range(5):
+        storage.consume([('slow', 'ip', 5, 300)], now=0)
+    for i in range(1000):
+        storage.consume([('fast', 'ip%d' % i, 5, 60)], now=0)
+    storage.consume([('slow', 'ip', 5, 300)], now=100)
+    storage.consume([('fast', 'ip', 5, 60)], now=100)
+    assert len(storage.scopes['slow']) == 1
+    assert len(storage.scopes['fast']) == 1
+
+
+def test_memory_storage_rejects_new_clients_when_full():
+    storage = MemoryStorage()
+    storage.max_clients = 100
+    for i in range(100):
+        storage.consume([('test', 'ip%d' % i, 5, 60)], now=0)
+    for i in range(4):
+        assert storage.consume([('test', 'ip0', 5, 60)], now=10) == 0
+    assert storage.consume([('test', 'ip0', 5, 60)], now=10) > 0
+    assert storage.consume([('test', 'new', 5, 60)], now=10) == 50
+    assert storage.consume([('test', 'new', 5, 60)], now=60) == 0
+    assert len(storage.scopes['test']) == 2
+
+
+# ========== Application tests ========== #
+
+def test_login_is_limited(client):
+    for i in range(5):
+        assert login(client, 'admin', '1.1.1.1').status_code == 200
+    response = login(client, 'admin', '1.1.1.1')
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '12'
+    assert b'Too Many Requests' in response.data
+
+
+def test_login_is_allowed_after_refill(client):
+    for i in range(5):
+        login(client, 'admin', '1.1.1.1')
+    client.clock[0] = 12
+    assert login(client, 'admin', '1.1.1.1').status_code == 200
+    assert login(client, 'admin', '1.1.1.1').status_code == 429
+
+
+def test_login_get_is_not_limited(client):
+    for i in range(5):
+        login(client, 'admin', '1.1.1.1')
+    response = client.get('/login', environ_base={'REMOTE_ADDR': '1.1.1.1'})
+    assert response.status_code == 200
+
+
+def test_login_single_client_cannot_lock_out_user(client):
+    for i in range(100):
+        login(client, 'admin', '1.1.1.1')
+    assert login(client, 'admin', '1.1.1.5').status_code == 200
+    assert login(client, 'admin', '1.1.1.6').status_code == 200
+
+
+def test_login_is_limited_per_client_ip(client):
+    for i in range(20):
+        assert login(client, 'user%d' % i, '1.1.1.1').status_code == 200
+    assert login(client, 'other', '1.1.1.1').status_code == 429
+    assert login(client, 'other', '2.2.2.2').status_code == 200
+
+
+def test_endpoints_are_limited_separately(client):
+    for i in range(20):
+        login(client, 'user%d' % i, '1.1.1.1')
+    assert login(client, 'other', '1.1.1.1').status_code == 429
+    response = client.post('/post/add', environ_base={'REMOTE_ADDR': '1.1.1.1'})
+    assert response.status_code == 200
+
+
+def test_post_add_is_limited_per_user(client):
+    with client.session_transaction() as session:
+        session['username'] = 'admin'
+    for i in range(10):
+        response = client.post('/post/add', environ_base={'REMOTE_ADDR': '1.1.1.%d' % i})
+        assert response.status_code == 200
+    response = client.post('/post/add', environ_base={'REMOTE_ADDR': '2.2.2.2'})
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '6'